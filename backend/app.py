@@ -3,12 +3,15 @@ from flask_jwt_extended import JWTManager
 from datetime import timedelta
 import os
 from dotenv import load_dotenv
-from utils import init_db
+from utils import configure_shard_layout, init_db
 from routes.auth_routes import auth_bp
 from routes.product_routes import products_bp
 
 load_dotenv()
 
+# Fail at startup rather than on every request if DB_SHARDS is invalid
+configure_shard_layout()
+
 app = Flask(__name__, static_folder='static')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'fallback-key-for-dev')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
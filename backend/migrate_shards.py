@@ -0,0 +1,264 @@
+"""Copy products and items from one database shard layout to another.
+
+Usage:
+    python migrate_shards.py --to 8
+    python migrate_shards.py --from 8 --to per_user
+    python migrate_shards.py --from per_user --to none --drop-source
+
+This is an offline tool: stop the backend before running it. The server only
+reads DB_SHARDS at startup, so while it runs it keeps writing to the old
+layout, and anything received or dispatched during or after the copy would be
+missing from the new one. Once the copy succeeds, set DB_SHARDS to the new
+layout in .env and restart the server.
+
+--from defaults to the current DB_SHARDS setting. Source databases are only
+read, never created. Users with no rows in the source are left untouched in
+the target. If the target already holds rows for a user being migrated, the
+run stops before writing anything. Pass --force to replace those rows, for
+example to finish an interrupted run.
+
+Source rows are left in place unless --drop-source is given. That option
+deletes the old shard files or, when migrating from the single-database
+layout, drops the products and items tables from DB_PATH. The file itself is
+kept because it holds the users table. --drop-source is refused when orphan
+items were skipped. It is also refused when the source holds rows for user
+ids missing from the users table, unless --drop-unmigrated is also given.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from dotenv import load_dotenv
+from utils import (connect_inventory_db, get_db, get_db_path, get_inventory_db_path,
+                   get_shard_layout, parse_shard_layout)
+
+def open_existing_db(path):
+    """Open an inventory database without creating anything.
+
+    Returns None if the file or its products and items tables do not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if not {'products', 'items'} <= tables:
+        conn.close()
+        return None
+    return conn
+
+def has_user_rows(conn, user_id):
+    """Check whether a database holds any products or items for a user."""
+    return (conn.execute('SELECT 1 FROM products WHERE user_id = ? LIMIT 1', (user_id,)).fetchone() is not None
+            or conn.execute('SELECT 1 FROM items WHERE user_id = ? LIMIT 1', (user_id,)).fetchone() is not None)
+
+def copy_row(target, table, row, **overrides):
+    """Insert a row into target, keeping its id unless that id is already taken."""
+    values = dict(zip(row.keys(), row))
+    values.update(overrides)
+
+    if target.execute(f'SELECT 1 FROM {table} WHERE id = ?', (values['id'],)).fetchone():
+        del values['id']
+
+    columns = ', '.join(values)
+    placeholders = ', '.join('?' for _ in values)
+    cursor = target.execute(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                            tuple(values.values()))
+    return cursor.lastrowid
+
+def copy_user(source, target, user_id):
+    """Copy one user's products and items, replacing any rows in target.
+
+    Returns (products, items, remapped ids, orphan item ids). Items whose
+    product row is missing are skipped and reported as orphans.
+    """
+    # Read products and items in one transaction so they are consistent
+    source.execute('BEGIN')
+    try:
+        product_rows = source.execute('SELECT * FROM products WHERE user_id = ? ORDER BY id',
+                                      (user_id,)).fetchall()
+        item_rows = source.execute('SELECT * FROM items WHERE user_id = ? ORDER BY id',
+                                   (user_id,)).fetchall()
+    finally:
+        source.rollback()
+
+    target.execute('DELETE FROM items WHERE user_id = ?', (user_id,))
+    target.execute('DELETE FROM products WHERE user_id = ?', (user_id,))
+
+    product_ids = {}
+    remapped = 0
+    for row in product_rows:
+        product_ids[row['id']] = copy_row(target, 'products', row)
+        if product_ids[row['id']] != row['id']:
+            remapped += 1
+
+    item_count = 0
+    orphans = []
+    for row in item_rows:
+        # Foreign keys are not enforced, so an item can outlive its product
+        if row['product_id'] not in product_ids:
+            orphans.append(row['id'])
+            continue
+        # Barcodes keep their original text, and dispatch looks items up by
+        # the full barcode, so printed labels stay valid after a remap
+        new_id = copy_row(target, 'items', row, product_id=product_ids[row['product_id']])
+        if new_id != row['id']:
+            remapped += 1
+        item_count += 1
+
+    return len(product_ids), item_count, remapped, orphans
+
+def get_user_ids():
+    """Get the ids of all users in the directory database."""
+    conn = get_db()
+    try:
+        return [row['id'] for row in conn.execute('SELECT id FROM users ORDER BY id').fetchall()]
+    finally:
+        conn.close()
+
+def find_unmigrated_users(paths):
+    """Find user ids with rows in the given databases but not in the users table."""
+    known = set(get_user_ids())
+    found = set()
+    for path in paths:
+        conn = open_existing_db(path)
+        if conn is None:
+            continue
+        found.update(row['user_id'] for row in
+                     conn.execute('SELECT user_id FROM products UNION SELECT user_id FROM items'))
+        conn.close()
+    return sorted(found - known)
+
+def drop_source(paths):
+    """Remove migrated data: delete shard files, or drop the tables from DB_PATH."""
+    for path in paths:
+        if path == get_db_path():
+            conn = get_db()
+            conn.execute('DROP TABLE IF EXISTS items')
+            conn.execute('DROP TABLE IF EXISTS products')
+            conn.commit()
+            conn.close()
+        else:
+            os.remove(path)
+
+def migrate(source_layout, target_layout, force=False):
+    """Copy every user's inventory from source_layout to target_layout.
+
+    Returns the totals and the set of source databases that were read.
+    Raises ValueError, before writing anything, if the target already holds
+    rows for a migrated user and force is not set.
+    """
+    sources = {}
+    targets = {}
+    def open_source(path):
+        if path not in sources:
+            sources[path] = open_existing_db(path)
+        return sources[path]
+
+    totals = {'users': 0, 'products': 0, 'items': 0, 'remapped': 0, 'orphans': []}
+    try:
+        # Work out which users have data to move before touching any target
+        plan = []
+        for user_id in get_user_ids():
+            source_path = get_inventory_db_path(user_id, source_layout)
+            target_path = get_inventory_db_path(user_id, target_layout)
+            if source_path == target_path:
+                raise ValueError(f'Source and target are the same database: {source_path}')
+            source = open_source(source_path)
+            if source is not None and has_user_rows(source, user_id):
+                plan.append((user_id, source_path, target_path))
+
+        conflicts = []
+        for user_id, _, target_path in plan:
+            target = open_existing_db(target_path)
+            if target is not None:
+                if has_user_rows(target, user_id):
+                    conflicts.append(user_id)
+                target.close()
+        if conflicts and not force:
+            raise ValueError(f'Target already holds data for users {conflicts}; '
+                             're-run with --force to replace it')
+
+        for user_id, source_path, target_path in plan:
+            if target_path not in targets:
+                targets[target_path] = connect_inventory_db(target_path)
+            target = targets[target_path]
+            try:
+                products, items, remapped, orphans = copy_user(sources[source_path], target, user_id)
+                target.commit()
+            except Exception:
+                target.rollback()
+                raise
+
+            totals['users'] += 1
+            totals['products'] += products
+            totals['items'] += items
+            totals['remapped'] += remapped
+            totals['orphans'].extend((user_id, item_id) for item_id in orphans)
+    finally:
+        for conn in list(sources.values()) + list(targets.values()):
+            if conn is not None:
+                conn.close()
+
+    source_paths = {path for path, conn in sources.items() if conn is not None}
+    return totals, source_paths
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Migrate inventory data between shard layouts. '
+                                                 'Stop the backend before running this.')
+    parser.add_argument('--from', dest='source', default=None,
+                        help="source layout: 'none', a shard count, or 'per_user' (default: DB_SHARDS)")
+    parser.add_argument('--to', dest='target', required=True,
+                        help="target layout: 'none', a shard count, or 'per_user'")
+    parser.add_argument('--force', action='store_true',
+                        help='replace rows the target already holds for migrated users')
+    parser.add_argument('--drop-source', action='store_true',
+                        help='after a successful copy, delete the old shard files or drop the '
+                             'products and items tables from DB_PATH')
+    parser.add_argument('--drop-unmigrated', action='store_true',
+                        help='let --drop-source remove rows of user ids missing from the users table')
+    args = parser.parse_args()
+
+    try:
+        source_layout = (get_shard_layout() if args.source is None
+                         else parse_shard_layout(args.source, '--from'))
+        target_layout = parse_shard_layout(args.target, '--to')
+    except ValueError as e:
+        parser.error(str(e))
+
+    if source_layout == target_layout:
+        parser.error('Source and target layouts are the same')
+
+    try:
+        totals, source_paths = migrate(source_layout, target_layout, force=args.force)
+    except Exception as e:
+        print(f'Migration failed: {e}', file=sys.stderr)
+        return 1
+
+    print(f"Migrated {totals['users']} users, {totals['products']} products, {totals['items']} items")
+    if totals['remapped']:
+        print(f"{totals['remapped']} rows were given new ids to avoid collisions in the target")
+    for user_id, item_id in totals['orphans']:
+        print(f'Skipped item {item_id} of user {user_id}: its product no longer exists', file=sys.stderr)
+    if totals['orphans']:
+        print(f"Skipped {len(totals['orphans'])} orphan items", file=sys.stderr)
+
+    if args.drop_source:
+        if totals['orphans']:
+            print('Not dropping source data: it still holds the skipped orphan items', file=sys.stderr)
+            return 1
+        unmigrated = find_unmigrated_users(source_paths)
+        if unmigrated and not args.drop_unmigrated:
+            print(f'Not dropping source data: it holds rows for user ids {unmigrated} that are not '
+                  'in the users table; pass --drop-unmigrated to drop them anyway', file=sys.stderr)
+            return 1
+        drop_source(source_paths)
+        print(f'Removed migrated data from {len(source_paths)} source databases')
+
+    print(f"Set DB_SHARDS={args.target} in .env and restart the backend to use the new layout")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
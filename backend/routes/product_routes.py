@@ -4,7 +4,7 @@ import os
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-from utils import generate_barcode_data, get_db, parse_barcode_data, generate_qr_code
+from utils import generate_barcode_data, get_user_db, parse_barcode_data, generate_qr_code
 
 products_bp = Blueprint('products_bp', __name__)
 
@@ -21,7 +21,7 @@ def get_products():
         print("get_products called")
         user_id = int(get_jwt_identity())
         print(f"user_id: {user_id}")
-        conn = get_db()
+        conn = get_user_db(user_id)
         cursor = conn.cursor()
 
         # Fetch all products for the user
@@ -122,7 +122,7 @@ def create_product():
             file.save(save_path)
             image_path = save_path
 
-        conn = get_db()
+        conn = get_user_db(user_id)
         cursor = conn.cursor()
 
         # Check if product name already exists for this user
@@ -177,7 +177,7 @@ def create_product():
 def get_product(product_id):
     try:
         user_id = int(get_jwt_identity())
-        conn = get_db()
+        conn = get_user_db(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -234,7 +234,7 @@ def receive_item(product_id):
     try:
         user_id = int(get_jwt_identity())
         
-        conn = get_db()
+        conn = get_user_db(user_id)
         cursor = conn.cursor()
         
         # Verify product exists and belongs to user
@@ -304,7 +304,7 @@ def dispatch_item():
         if not parsed or parsed['user_id'] != user_id:
             return jsonify({'message': 'Invalid barcode'}), 400
         
-        conn = get_db()
+        conn = get_user_db(user_id)
         cursor = conn.cursor()
         
         # Find item
@@ -364,7 +364,7 @@ def dispatch_item():
 def get_alerts():
     try:
         user_id = int(get_jwt_identity())
-        conn = get_db()
+        conn = get_user_db(user_id)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -397,7 +397,7 @@ def get_alerts():
 def get_dashboard_stats():
     try:
         user_id = int(get_jwt_identity())
-        conn = get_db()
+        conn = get_user_db(user_id)
         cursor = conn.cursor()
         
         # Total products
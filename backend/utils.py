@@ -1,24 +1,65 @@
 import sqlite3
+import os
 import qrcode
 import io
 import base64
 import re
 
-def init_db():
-    """Initialize the database with required tables."""
-    conn = sqlite3.connect('inventory.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
+SHARD_DIR_DEFAULT = 'shards'
+
+# Inventory databases whose tables have already been created in this process
+_initialized_dbs = set()
+
+# Shard layout parsed from DB_SHARDS by configure_shard_layout()
+_UNSET = object()
+_shard_layout = _UNSET
+
+def get_db_path():
+    """Get the path of the directory database that holds the users table."""
+    return os.getenv('DB_PATH', 'inventory.db')
+
+def parse_shard_layout(value, name='DB_SHARDS'):
+    """Parse a shard layout: None (single database), a shard count, or 'per_user'."""
+    value = str(value or '').strip().lower()
+    if value in ('', '0', 'off', 'none'):
+        return None
+    if value == 'per_user':
+        return value
+    try:
+        count = int(value)
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise ValueError(f"{name} must be 'none', a positive integer, or 'per_user' (got '{value}')")
+    return count
+
+def configure_shard_layout():
+    """Parse and validate DB_SHARDS once; call at startup after loading .env."""
+    global _shard_layout
+    _shard_layout = parse_shard_layout(os.getenv('DB_SHARDS', ''))
+    return _shard_layout
+
+def get_shard_layout():
+    """Get the shard layout configured through DB_SHARDS."""
+    if _shard_layout is _UNSET:
+        return configure_shard_layout()
+    return _shard_layout
+
+def get_inventory_db_path(user_id, layout):
+    """Get the path of the database holding a user's products and items."""
+    if layout is None:
+        return get_db_path()
+    shard_dir = os.getenv('DB_SHARD_DIR', SHARD_DIR_DEFAULT)
+    if layout == 'per_user':
+        return os.path.join(shard_dir, f'user_{user_id}.db')
+    return os.path.join(shard_dir, f'shard_{user_id % layout}_of_{layout}.db')
+
+def _create_inventory_tables(cursor, user_fk=True):
+    """Create the products and items tables and their indexes."""
+    # Shards do not hold the users table, so they cannot reference it
+    user_fk_clause = ',\n            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE' if user_fk else ''
+
+    cursor.execute(f'''
         CREATE TABLE IF NOT EXISTS products (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
@@ -27,12 +68,11 @@ def init_db():
             image_path TEXT,
             quantity INTEGER DEFAULT 0,
             threshold INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{user_fk_clause}
         )
     ''')
     
-    cursor.execute('''
+    cursor.execute(f'''
         CREATE TABLE IF NOT EXISTS items (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             product_id INTEGER NOT NULL,
@@ -41,8 +81,7 @@ def init_db():
             barcode TEXT UNIQUE NOT NULL,
             received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             dispatched_at TIMESTAMP,
-            FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE,
-            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE{user_fk_clause}
         )
     ''')
     
@@ -51,16 +90,54 @@ def init_db():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_user_id ON items (user_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_product_id ON items (product_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_barcode ON items (barcode)')
+
+def init_db():
+    """Initialize the database with required tables."""
+    conn = sqlite3.connect(get_db_path())
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # In sharded mode products and items live in shard files created on first use
+    if get_shard_layout() is None:
+        _create_inventory_tables(cursor)
     
     conn.commit()
     conn.close()
 
 def get_db():
-    """Get database connection with row factory."""
-    conn = sqlite3.connect('inventory.db')
+    """Get directory database connection with row factory."""
+    conn = sqlite3.connect(get_db_path())
     conn.row_factory = sqlite3.Row
     return conn
 
+def connect_inventory_db(path):
+    """Get inventory database connection, creating its tables on first use."""
+    if path not in _initialized_dbs:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path)
+        _create_inventory_tables(conn.cursor(), user_fk=(path == get_db_path()))
+        conn.commit()
+        conn.close()
+        _initialized_dbs.add(path)
+    
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def get_user_db(user_id):
+    """Get connection to the database holding a user's products and items."""
+    return connect_inventory_db(get_inventory_db_path(user_id, get_shard_layout()))
+
 def generate_barcode_data(user_id, product_id, item_id):
     """Generate barcode data string."""
     return f"{user_id}|{product_id}|{item_id}"